@@ -1,45 +1,174 @@
+import ctypes
+import ctypes.util
+import errno
+import fnmatch
+import json
+import logging
+import os
+import select
+import signal
+import struct
 import sys
-import traceback
+import threading
+from logging.handlers import RotatingFileHandler
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
-from pathlib import Path
+from pathlib import Path, PurePath
 import re
 import datetime
-import shutil
 import time
 import tomllib
-from typing import Callable
+from typing import Callable, Iterable, Iterator
 from watchdog.observers import Observer
-from watchdog.events import FileSystemEventHandler
+from watchdog.observers.api import BaseObserver
+from watchdog.observers.polling import PollingObserver
+from watchdog.events import PatternMatchingEventHandler
+
+if sys.platform != 'win32':
+    import fcntl
+
+_copy_file2: Callable[[str, str, None], int] | None = None
+if sys.platform == 'win32':
+    _kernel32_copy_file2 = getattr(ctypes.windll.kernel32, 'CopyFile2', None)
+    if _kernel32_copy_file2:
+        _kernel32_copy_file2.argtypes = [ctypes.c_wchar_p, ctypes.c_wchar_p, ctypes.c_void_p]
+        _kernel32_copy_file2.restype = ctypes.HRESULT  # raises OSError on failure
+        _copy_file2 = _kernel32_copy_file2
+
+COPY_CHUNK_SIZE = 1 << 20
+DEFAULT_COPY_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+_copy_buffers = threading.local()
+BACKUP_NAME_FORMAT = '%Y%m%d_%H%M%S'
+_BACKUP_NAME_RE = re.compile(r'\A\d{8}_\d{6}\Z')
+STATE_FILE_NAME = '_state.json'
+_state_lock = threading.Lock()
+DEFAULT_EXCLUDE_PATTERNS = ("libraries/**", "versions/**", "logs/**", "crash-reports/**")
+logger = logging.getLogger('mcbackup')
+
+
+def get_last_backup_name(backup_path: Path) -> str | None:
+    # YYYYMMDD_HHMMSS names sort in chronological order
+    return max((n for n in os.listdir(backup_path) if _BACKUP_NAME_RE.match(n)), default=None)
+
+
+def _parse_stamp(s: str) -> datetime.datetime:
+    # same as strptime(s, BACKUP_NAME_FORMAT) for names matching _BACKUP_NAME_RE
+    return datetime.datetime(int(s[0:4]), int(s[4:6]), int(s[6:8]), int(s[9:11]), int(s[11:13]), int(s[13:15]))
 
 
 def get_last_backup_datetime(backup_path: Path) -> datetime.datetime:
-    last_datetime = datetime.datetime(1980, 1, 1, 0, 0, 0)
-    for name in [n for n in backup_path.iterdir()]:
-        m = re.match(r'^(\d{8})_(\d{6})$', name.stem)
-        if not m:
+    name = get_last_backup_name(backup_path)
+    if name is None:
+        return datetime.datetime(1980, 1, 1, 0, 0, 0)
+    return _parse_stamp(name)
+
+
+def _compile_patterns(patterns: Iterable[str]) -> re.Pattern | None:
+    patterns = list(patterns)
+    if not patterns:
+        return None
+    flags = re.IGNORECASE if os.name == 'nt' else 0
+    return re.compile('|'.join(fnmatch.translate(pattern) for pattern in patterns), flags)
+
+
+def _relative_path(root: Path, path: str) -> str:
+    return os.path.relpath(path, root).replace(os.sep, '/')
+
+
+@dataclass(slots=True, frozen=True)
+class PathFilter:
+    # patterns are matched against '/'-separated paths relative to the minecraft directory
+    include: re.Pattern | None = None
+    exclude: re.Pattern | None = None
+
+    @classmethod
+    def from_patterns(cls, include_patterns: Iterable[str] = (), exclude_patterns: Iterable[str] = ()) -> 'PathFilter':
+        return cls(_compile_patterns(include_patterns), _compile_patterns(exclude_patterns))
+
+    def skips_file(self, relative_path: str) -> bool:
+        if self.exclude and self.exclude.match(relative_path):
+            return True
+        return self.include is not None and not self.include.match(relative_path)
+
+    def skips_directory(self, relative_path: str) -> bool:
+        # 'libraries/**' matches 'libraries/', so the whole directory is pruned
+        return self.exclude is not None and self.exclude.match(relative_path + '/') is not None
+
+
+NO_FILTER = PathFilter()
+
+
+def _walk(root: Path, path_filter: PathFilter = NO_FILTER) -> Iterator[os.DirEntry]:
+    stack: list[tuple[str | os.PathLike[str], str]] = [(root, '')]
+    while stack:
+        directory, prefix = stack.pop()
+        try:
+            it = os.scandir(directory)
+        except OSError as e:
+            # unreadable, or removed while Minecraft was saving; skip it like rglob did
+            logger.warning("Cannot read directory %s: %s", directory, e)
             continue
-        dt = datetime.datetime.strptime(m.group(0), '%Y%m%d_%H%M%S')
-        if last_datetime < dt:
-            last_datetime = dt
-    return last_datetime
+        with it:
+            for entry in it:
+                relative_path = prefix + entry.name
+                if entry.is_dir(follow_symlinks=False):
+                    if not path_filter.skips_directory(relative_path):
+                        stack.append((entry.path, relative_path + '/'))
+                elif entry.is_file(follow_symlinks=False):
+                    if not path_filter.skips_file(relative_path):
+                        yield entry
 
 
 def get_last_change_datetime(minecraft_directory: Path) -> datetime.datetime:
-    last_change = datetime.datetime(1980, 1, 1, 0, 0, 0)
-    for p in minecraft_directory.rglob('*'):
-        if p.is_file():
-            ts = p.stat().st_mtime
-            dt = datetime.datetime.fromtimestamp(ts)
-            if last_change < dt:
-                last_change = dt
-    return last_change
+    last_change = datetime.datetime(1980, 1, 1, 0, 0, 0).timestamp()
+    for entry in _walk(minecraft_directory):
+        try:
+            ts = entry.stat(follow_symlinks=False).st_mtime
+        except FileNotFoundError:
+            continue
+        if last_change < ts:
+            last_change = ts
+    return datetime.datetime.fromtimestamp(last_change)
+
+
+def any_change_after(minecraft_directory: Path, threshold: float, path_filter: PathFilter = NO_FILTER) -> bool:
+    for entry in _walk(minecraft_directory, path_filter):
+        try:
+            if entry.stat(follow_symlinks=False).st_mtime > threshold:
+                return True
+        except FileNotFoundError:
+            continue
+    return False
+
+
+def scan(minecraft_directory: Path,
+         path_filter: PathFilter = NO_FILTER) -> tuple[list[tuple[str, os.stat_result]], float]:
+    entries = []
+    last_change = 0.0
+    for entry in _walk(minecraft_directory, path_filter):
+        try:
+            st = entry.stat(follow_symlinks=False)
+        except FileNotFoundError:
+            continue
+        entries.append((entry.path, st))
+        if last_change < st.st_mtime:
+            last_change = st.st_mtime
+    return entries, last_change
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class Config:
     minecraft_directory: Path
     backup_path: Path
     backup_interval: datetime.timedelta
+    reflink: bool = False
+    copy_workers: int = DEFAULT_COPY_WORKERS
+    verbose: bool = False
+    include_patterns: tuple[str, ...] = ()
+    exclude_patterns: tuple[str, ...] = DEFAULT_EXCLUDE_PATTERNS
+
+    def path_filter(self) -> PathFilter:
+        return PathFilter.from_patterns(self.include_patterns, self.exclude_patterns)
 
 
 def read_config() -> Config:
@@ -49,54 +178,353 @@ def read_config() -> Config:
     assert "minecraft_directory" in config
     assert "backup_path" in config
     assert "backup_interval_minutes" in config
-    config["minecraft_directory"] = Path(config["minecraft_directory"])
-    config["backup_path"] = Path(config["backup_path"])
     return Config(
         minecraft_directory=Path(config["minecraft_directory"]),
         backup_path=Path(config["backup_path"]),
         backup_interval=datetime.timedelta(minutes=config["backup_interval_minutes"]),
+        reflink=config.get("reflink", False),
+        copy_workers=config.get("copy_workers", DEFAULT_COPY_WORKERS),
+        verbose=config.get("verbose", False),
+        include_patterns=tuple(config.get("include_patterns", ())),
+        exclude_patterns=tuple(config.get("exclude_patterns", DEFAULT_EXCLUDE_PATTERNS)),
     )
 
 
-def start_watch_for_modification(minecraft_directory: Path, recorder: 'BackupScheduler'):
-    class ModificationWatcher(FileSystemEventHandler):
-        def __init__(self):
-            self.recorder = recorder
+WATCH_IGNORE_PATTERNS = ["*.log", "*.log.gz", "logs/*", "crash-reports/*"]
 
-        def on_modified(self, event):
-            scheduler = self.recorder
-            time = datetime.datetime.now()
-            scheduler.last_modification_time = time
 
-    event_handler = ModificationWatcher()
+def make_observer() -> BaseObserver:
     observer = Observer()
+    if isinstance(observer, PollingObserver):
+        logger.warning("Native file change notification is not available, falling back to polling")
+    return observer
+
+
+class InotifyWatcher(threading.Thread):
+    IN_MODIFY = 0x00000002
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_Q_OVERFLOW = 0x00004000
+    IN_IGNORED = 0x00008000
+    IN_ISDIR = 0x40000000
+    IN_CLOEXEC = 0o2000000
+    WATCH_MASK = IN_MODIFY | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+    EVENT_HEADER = struct.Struct('iIII')
+    READ_SIZE = 65536
+
+    def __init__(self, root: Path, on_change: Callable[[], None], on_overflow: Callable[[], None],
+                 path_filter: PathFilter = NO_FILTER):
+        super().__init__(daemon=True)
+        self.root = root
+        self.on_change = on_change
+        self.on_overflow = on_overflow
+        self.path_filter = path_filter
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        try:
+            self._inotify_add_watch = libc.inotify_add_watch
+            inotify_init1 = libc.inotify_init1
+        except AttributeError:
+            raise OSError(errno.ENOSYS, "inotify is not supported by this libc")
+        self._fd = inotify_init1(InotifyWatcher.IN_CLOEXEC)
+        if self._fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+        self._stop_r, self._stop_w = os.pipe()
+        self._closed = False
+        self._close_lock = threading.Lock()
+        self._paths: dict[int, str] = {}
+        try:
+            # a watcher missing some of the tree would silently miss changes; let the caller poll instead
+            self._add_tree(str(root), strict=True)
+        except OSError:
+            for fd in (self._fd, self._stop_r, self._stop_w):
+                os.close(fd)
+            raise
+
+    def _add_tree(self, top: str, strict: bool = False) -> bool:
+        added_all = True
+        for directory, subdirectories, _ in os.walk(top):
+            subdirectories[:] = [d for d in subdirectories if not self.path_filter.skips_directory(
+                _relative_path(self.root, os.path.join(directory, d)))]
+            wd = self._inotify_add_watch(self._fd, os.fsencode(directory), InotifyWatcher.WATCH_MASK)
+            if wd < 0:
+                err = ctypes.get_errno()
+                if strict:
+                    raise OSError(err, f"Cannot watch {directory}: {os.strerror(err)}")
+                logger.warning("Cannot watch %s: %s", directory, os.strerror(err))
+                added_all = False
+                continue
+            self._paths[wd] = directory
+        return added_all
+
+    def run(self):
+        try:
+            while True:
+                readable, _, _ = select.select([self._fd, self._stop_r], [], [])
+                if self._stop_r in readable:
+                    return
+                # a single read returns every event queued so far; handle them as one batch
+                buffer = os.read(self._fd, InotifyWatcher.READ_SIZE)
+                try:
+                    self._handle(buffer)
+                except Exception:
+                    logger.exception("Error while handling file change events")
+        finally:
+            with self._close_lock:
+                self._closed = True
+                for fd in (self._fd, self._stop_r, self._stop_w):
+                    os.close(fd)
+
+    def _handle(self, buffer: bytes) -> None:
+        changed = overflowed = False
+        offset = 0
+        while offset < len(buffer):
+            wd, mask, _, length = InotifyWatcher.EVENT_HEADER.unpack_from(buffer, offset)
+            offset += InotifyWatcher.EVENT_HEADER.size
+            name = os.fsdecode(buffer[offset:offset + length].rstrip(b'\0'))
+            offset += length
+            if mask & InotifyWatcher.IN_Q_OVERFLOW:
+                overflowed = True
+                continue
+            if mask & InotifyWatcher.IN_IGNORED:
+                self._paths.pop(wd, None)
+                continue
+            directory = self._paths.get(wd)
+            if directory is None:
+                continue
+            path = os.path.join(directory, name)
+            relative_path = _relative_path(self.root, path)
+            if mask & InotifyWatcher.IN_ISDIR:
+                if self.path_filter.skips_directory(relative_path):
+                    continue
+                if mask & (InotifyWatcher.IN_CREATE | InotifyWatcher.IN_MOVED_TO) and not self._add_tree(path):
+                    # changes under the unwatched directory would be missed; rescan instead
+                    overflowed = True
+            elif self.path_filter.skips_file(relative_path):
+                continue
+            if not any(PurePath(path).match(pattern) for pattern in WATCH_IGNORE_PATTERNS):
+                changed = True
+        if overflowed:
+            self._add_tree(str(self.root))
+            self.on_overflow()
+        elif changed:
+            self.on_change()
+
+    def stop(self) -> None:
+        with self._close_lock:
+            if not self._closed:
+                os.write(self._stop_w, b'\0')
+
+
+class ModificationWatcher(PatternMatchingEventHandler):
+    def __init__(self, minecraft_directory: Path, on_change: Callable[[], None], path_filter: PathFilter = NO_FILTER):
+        super().__init__(ignore_patterns=WATCH_IGNORE_PATTERNS, ignore_directories=True)
+        self.minecraft_directory = minecraft_directory
+        self.on_change = on_change
+        self.path_filter = path_filter
+
+    def on_created(self, event):
+        self.record(event)
+
+    def on_deleted(self, event):
+        self.record(event)
+
+    def on_modified(self, event):
+        self.record(event)
+
+    def on_moved(self, event):
+        self.record(event)
+
+    def record(self, event):
+        if not self.path_filter.skips_file(_relative_path(self.minecraft_directory, os.fsdecode(event.src_path))):
+            self.on_change()
+
+
+def start_watch_for_modification(minecraft_directory: Path, recorder: 'BackupScheduler', backup_path: Path,
+                                 path_filter: PathFilter = NO_FILTER):
+    def record_modification():
+        already_updated = recorder.updated_since_last_backup()
+        time = datetime.datetime.now()
+        recorder.last_modification_time = time
+        if not already_updated:
+            try:
+                write_state(backup_path, recorder)
+            except OSError as e:
+                # the state file is only a startup shortcut; keep watching even if it cannot be written
+                logger.warning("Cannot write backup state to %s: %s", backup_path, e)
+
+    def rescan():
+        logger.warning("Change notifications were lost, rescanning %s", minecraft_directory)
+        threshold = recorder.last_backup_time.timestamp() if recorder.last_backup_time else 0.0
+        if any_change_after(minecraft_directory, threshold, path_filter):
+            record_modification()
+
+    inotify_failed = False
+    if sys.platform.startswith('linux'):
+        try:
+            watcher = InotifyWatcher(minecraft_directory, record_modification, rescan, path_filter)
+            watcher.start()
+            return watcher
+        except OSError as e:
+            # watchdog's inotify observer would hit the same limit, so poll instead
+            logger.warning("Cannot use inotify (%s), falling back to polling", e)
+            inotify_failed = True
+
+    event_handler = ModificationWatcher(minecraft_directory, record_modification, path_filter)
+    observer = PollingObserver() if inotify_failed else make_observer()
     observer.schedule(event_handler, str(minecraft_directory), recursive=True)
     observer.start()
+    return observer
 
 
 def make_new_backup_directory(backup_path: Path) -> Path:
     current_time = datetime.datetime.now()
-    backup_dir_name = current_time.strftime("%Y%m%d_%H%M%S")
+    backup_dir_name = current_time.strftime(BACKUP_NAME_FORMAT)
     backup_dir = backup_path / backup_dir_name
     backup_dir.mkdir(parents=True, exist_ok=True)
     return backup_dir
 
 
-def backup_worlds(minecraft_directory: Path, backup_path: Path) -> None:
-    new_backup_dir = make_new_backup_directory(backup_path)
-    print(f"Starting new backup to {new_backup_dir}")
+FICLONE = 0x40049409
+_CLONE_UNSUPPORTED = {errno.EXDEV, errno.EOPNOTSUPP, errno.ENOTTY, errno.EINVAL, errno.ENOSYS}
+_SENDFILE_UNSUPPORTED = {errno.EINVAL, errno.ENOSYS, errno.EOPNOTSUPP, errno.ENOTSOCK}
 
-    for source_path in minecraft_directory.rglob('*'):  # Use rglob for recursion
-        if not source_path.is_file():
-            continue
-        relative_path = source_path.relative_to(minecraft_directory)  # Get path relative to source
+
+def _clone(src_fd: int, dst_fd: int) -> bool:
+    if sys.platform.startswith('linux'):
+        try:
+            fcntl.ioctl(dst_fd, FICLONE, src_fd)
+            return True
+        except OSError as e:
+            if e.errno not in _CLONE_UNSUPPORTED:
+                raise
+    if hasattr(os, 'copy_file_range'):
+        try:
+            while os.copy_file_range(src_fd, dst_fd, 1 << 30):
+                pass
+            return True
+        except OSError as e:
+            if e.errno not in _CLONE_UNSUPPORTED:
+                raise
+    return False
+
+
+def _sendfile(src_fd: int, dst_fd: int) -> bool:
+    if not sys.platform.startswith('linux'):
+        return False
+    copied = 0
+    try:
+        while n := os.sendfile(dst_fd, src_fd, None, COPY_CHUNK_SIZE):
+            copied += n
+    except OSError as e:
+        # some FUSE and network filesystems reject sendfile up front; copy through a buffer instead
+        if copied or e.errno not in _SENDFILE_UNSUPPORTED:
+            raise
+        return False
+    return True
+
+
+def _copy_data(src_fd: int, dst_fd: int) -> None:
+    if _sendfile(src_fd, dst_fd):
+        return
+    if not hasattr(_copy_buffers, 'buffer'):
+        _copy_buffers.buffer = bytearray(COPY_CHUNK_SIZE)
+        _copy_buffers.view = memoryview(_copy_buffers.buffer)
+    buffer, view = _copy_buffers.buffer, _copy_buffers.view
+    with open(src_fd, 'rb', buffering=0, closefd=False) as src, \
+            open(dst_fd, 'wb', buffering=0, closefd=False) as dst:
+        while n := src.readinto(buffer):
+            dst.write(view[:n])
+
+
+def _copy_with_copy_file2(source_path: Path, dest_path: Path) -> bool:
+    if _copy_file2 is None:
+        return False
+    try:
+        _copy_file2(str(source_path), str(dest_path), None)
+        return True
+    except OSError:
+        return False
+
+
+def _copy_with_fds(source_path: Path, dest_path: Path, reflink: bool) -> None:
+    src_fd = os.open(source_path, os.O_RDONLY | getattr(os, 'O_BINARY', 0))
+    try:
+        dst_fd = os.open(dest_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_BINARY', 0),
+                         0o666)
+        try:
+            if not (reflink and _clone(src_fd, dst_fd)):
+                _copy_data(src_fd, dst_fd)
+        finally:
+            os.close(dst_fd)
+    finally:
+        os.close(src_fd)
+
+
+def copy_file(source_path: Path, dest_path: Path, st: os.stat_result, reflink: bool = False) -> None:
+    if not _copy_with_copy_file2(source_path, dest_path):
+        _copy_with_fds(source_path, dest_path, reflink)
+    # keep timestamps so that a restored world looks as it was, without a full copystat
+    os.utime(dest_path, ns=(st.st_atime_ns, st.st_mtime_ns))
+
+
+def link_if_unchanged(previous_path: Path, dest_path: Path, st: os.stat_result) -> bool:
+    try:
+        previous = os.stat(previous_path)
+        if previous.st_mtime != st.st_mtime or previous.st_size != st.st_size:
+            return False
+        os.link(previous_path, dest_path)
+        return True
+    except OSError:
+        return False
+
+
+def backup_worlds(minecraft_directory: Path, backup_path: Path, reflink: bool = False,
+                  copy_workers: int = DEFAULT_COPY_WORKERS, verbose: bool = False,
+                  entries: list[tuple[str, os.stat_result]] | None = None,
+                  path_filter: PathFilter = NO_FILTER) -> None:
+    started = time.monotonic()
+    last_backup_name = get_last_backup_name(backup_path)
+    new_backup_dir = make_new_backup_directory(backup_path)
+    last_backup_dir = None
+    if last_backup_name and last_backup_name != new_backup_dir.name:
+        last_backup_dir = backup_path / last_backup_name
+    logger.info("Starting new backup to %s", new_backup_dir)
+
+    if entries is None:
+        entries, _ = scan(minecraft_directory, path_filter)
+    copies = []
+    dest_dirs = set()
+    for source, st in entries:
+        relative_path = Path(source).relative_to(minecraft_directory)  # Get path relative to source
         dest_path = new_backup_dir / relative_path
-        dest_path.parent.mkdir(parents=True, exist_ok=True)  # Create subdirs if needed 
+        dest_dirs.add(dest_path.parent)
+        copies.append((source, st, dest_path, relative_path))
+    for dest_dir in sorted(dest_dirs, key=lambda d: len(d.parts)):
+        dest_dir.mkdir(parents=True, exist_ok=True)  # Create subdirs once, parents first
+
+    def copy_one(copy: tuple[str, os.stat_result, Path, Path]) -> tuple[str, int]:
+        source, st, dest_path, relative_path = copy
         try:
-            shutil.copy2(source_path, dest_path)
-            print(f"Copied: {relative_path}")
-        except shutil.Error as e:
-            print(f"Error copying {source_path}: {e}")
+            if last_backup_dir and link_if_unchanged(last_backup_dir / relative_path, dest_path, st):
+                return "Linked", st.st_size
+            copy_file(Path(source), dest_path, st, reflink)
+            return "Copied", st.st_size
+        except OSError as e:
+            logger.error("Error copying %s: %s", source, e)
+            return "Error", 0
+
+    with ThreadPoolExecutor(max_workers=copy_workers) as executor:
+        results = list(executor.map(copy_one, copies))
+
+    if verbose:
+        logger.info("\n".join(f"{action}: {copy[3]}" for copy, (action, _) in zip(copies, results)))
+    copied = [size for action, size in results if action == "Copied"]
+    linked = sum(1 for action, _ in results if action == "Linked")
+    logger.info("Copied %d files (%.2f GB), linked %d unchanged files in %.1fs",
+                len(copied), sum(copied) / 1e9, linked, time.monotonic() - started)
 
 
 class BackupScheduler:
@@ -141,30 +569,109 @@ class BackupScheduler:
         return BackupScheduler.DENOUNCEMENT_TIME - (last_checked - self.last_modification_time)
 
 
-def start_auto_backup(config: Config, do_backup: Callable[[], None]):
+def read_state(backup_path: Path, scheduler: BackupScheduler) -> bool:
+    try:
+        with open(backup_path / STATE_FILE_NAME, encoding='utf-8') as f:
+            state = json.load(f)
+        times = {}
+        for key in ("last_modification_time", "last_backup_time"):
+            value = state.get(key)
+            times[key] = datetime.datetime.fromisoformat(value) if value else None
+    except (OSError, ValueError, TypeError, AttributeError):
+        # a broken state file is treated as missing, so the caller falls back to scanning
+        return False
+    for key, value in times.items():
+        setattr(scheduler, key, value)
+    return True
+
+
+def write_state(backup_path: Path, scheduler: BackupScheduler) -> None:
+    state = {}
+    for key in ("last_modification_time", "last_backup_time"):
+        value = getattr(scheduler, key)
+        state[key] = value.isoformat() if value else None
+    state_file = backup_path / STATE_FILE_NAME
+    with _state_lock:
+        temp_file = state_file.with_suffix('.tmp')
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(temp_file, state_file)
+
+
+def _wait_for_stop(stop: threading.Event, timeout: float) -> bool:
+    if sys.platform != 'win32':
+        return stop.wait(timeout)
+    # Event.wait cannot be interrupted by Ctrl+C on Windows, so wait in short slices
+    # to let the signal handler run
+    deadline = time.monotonic() + timeout
+    while (remaining := deadline - time.monotonic()) > 0:
+        if stop.wait(min(remaining, 1.0)):
+            return True
+    return stop.is_set()
+
+
+def start_auto_backup(config: Config, do_backup: Callable[[list | None], None], stop: threading.Event | None = None):
+    stop = stop or threading.Event()
+    path_filter = config.path_filter()
     scheduler = BackupScheduler(config.backup_interval)
-    scheduler.last_modification_time = get_last_change_datetime(config.minecraft_directory)
-    scheduler.last_backup_time = get_last_backup_datetime(config.backup_path)
-    start_watch_for_modification(config.minecraft_directory, scheduler)
+    scanned_entries = None
+    if not read_state(config.backup_path, scheduler):
+        scheduler.last_backup_time = get_last_backup_datetime(config.backup_path)
+        entries, last_change = scan(config.minecraft_directory, path_filter)
+        if scheduler.last_backup_time.timestamp() < last_change:
+            scheduler.last_modification_time = datetime.datetime.fromtimestamp(last_change)
+            scanned_entries = entries
+        write_state(config.backup_path, scheduler)
+    scanned_modification_time = scheduler.last_modification_time
+    watcher = start_watch_for_modification(config.minecraft_directory, scheduler, config.backup_path, path_filter)
 
-    while True:
-        if scheduler.needs_backup(datetime.datetime.now()):
-            do_backup()
-            scheduler.last_backup_time = datetime.datetime.now()
-        time.sleep(scheduler.next_check_time(datetime.datetime.now()).total_seconds())
+    try:
+        while True:
+            if scheduler.needs_backup(datetime.datetime.now()):
+                # the startup scan can drive the first backup unless the watcher has seen changes since
+                if scheduler.last_modification_time != scanned_modification_time:
+                    scanned_entries = None
+                do_backup(scanned_entries)
+                scanned_entries = None
+                scheduler.last_backup_time = datetime.datetime.now()
+                write_state(config.backup_path, scheduler)
+            if _wait_for_stop(stop, scheduler.next_check_time(datetime.datetime.now()).total_seconds()):
+                break
+    finally:
+        watcher.stop()
+        watcher.join()
+
+
+def setup_logging() -> None:
+    formatter = logging.Formatter('%(asctime)s %(levelname)s %(message)s')
+    file_handler = RotatingFileHandler('mcbackup.log', maxBytes=10_000_000, backupCount=5, encoding='utf-8')
+    console_handler = logging.StreamHandler()
+    for handler in (file_handler, console_handler):
+        handler.setFormatter(formatter)
+        logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
 
 
 def main():
+    setup_logging()
     config = read_config()
 
-    def do_backup():
-        backup_worlds(config.minecraft_directory, config.backup_path)
+    path_filter = config.path_filter()
+
+    def do_backup(entries=None):
+        backup_worlds(config.minecraft_directory, config.backup_path, config.reflink, config.copy_workers,
+                      config.verbose, entries, path_filter)
+
+    stop = threading.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: stop.set())
 
     try:
-        start_auto_backup(config, do_backup)
+        start_auto_backup(config, do_backup, stop)
     except:
-        traceback.print_exc()
-        input("Press Enter to exit")
+        logger.exception("Auto backup stopped by an error")
+        if sys.stdin and sys.stdin.isatty():
+            input("Press Enter to exit")
         sys.exit(1)
 
 
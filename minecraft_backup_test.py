@@ -1,9 +1,19 @@
 import pytest
 from datetime import datetime, timedelta
+import ctypes
+import ctypes.util
+import errno
 import os
+import sys
+import threading
 from pathlib import Path
+from watchdog.events import FileCreatedEvent, FileDeletedEvent, FileModifiedEvent, FileMovedEvent, \
+    FileOpenedEvent, DirModifiedEvent
 
-from minecraft_backup import get_last_change_datetime, get_last_backup_datetime, BackupScheduler
+import minecraft_backup
+from minecraft_backup import get_last_change_datetime, get_last_backup_datetime, any_change_after, BackupScheduler, \
+    copy_file, backup_worlds, read_state, write_state, scan, InotifyWatcher, \
+    Config, start_auto_backup, PathFilter, ModificationWatcher
 
 
 def test_get_last_change_datetime(tmpdir):
@@ -20,6 +30,67 @@ def test_get_last_change_datetime(tmpdir):
     assert get_last_change_datetime(Path(tmpdir)) == d2
 
 
+def test_any_change_after(tmpdir):
+    f1 = tmpdir.mkdir("dir1").join("file1")
+    f1.write("")
+    d1 = datetime(2024, 1, 1, 1, 23, 45)
+    os.utime(f1, (d1.timestamp(), d1.timestamp()))
+
+    assert any_change_after(Path(tmpdir), (d1 - timedelta(seconds=1)).timestamp())
+    assert not any_change_after(Path(tmpdir), d1.timestamp())
+
+
+def test_scan(tmpdir):
+    f1 = tmpdir.mkdir("dir1").join("file1")
+    f1.write("")
+    d1 = datetime(2024, 1, 1, 1, 23, 45)
+    os.utime(f1, (d1.timestamp(), d1.timestamp()))
+
+    entries, last_change = scan(Path(tmpdir))
+
+    assert [path for path, _ in entries] == [str(f1)]
+    assert last_change == d1.timestamp()
+
+
+def test_scan_skips_filtered_paths(tmpdir):
+    tmpdir.mkdir("libraries").join("library.jar").write("")
+    tmpdir.mkdir("world").join("level.dat").write("")
+    tmpdir.join("world", "session.lock").write("")
+    path_filter = PathFilter.from_patterns(include_patterns=["world/*.dat"], exclude_patterns=["libraries/**"])
+
+    entries, _ = scan(Path(tmpdir), path_filter)
+
+    assert [path for path, _ in entries] == [str(tmpdir.join("world", "level.dat"))]
+    assert path_filter.skips_directory("libraries")
+    assert not path_filter.skips_directory("world")
+
+
+def test_any_change_after_skips_vanished_files(tmpdir, monkeypatch):
+    class VanishedEntry:
+        def stat(self, follow_symlinks=True):
+            raise FileNotFoundError("vanished")
+    monkeypatch.setattr(minecraft_backup, "_walk", lambda *args: iter([VanishedEntry()]))
+
+    assert not any_change_after(Path(tmpdir), 0.0)
+    assert get_last_change_datetime(Path(tmpdir)) == datetime(1980, 1, 1)
+
+
+def test_scan_skips_unreadable_directories(tmpdir, monkeypatch):
+    tmpdir.mkdir("locked").join("file").write("")
+    tmpdir.mkdir("world").join("level.dat").write("")
+    scandir = os.scandir
+
+    def failing_scandir(path):
+        if os.path.basename(path) == "locked":
+            raise PermissionError(errno.EACCES, "Permission denied", path)
+        return scandir(path)
+    monkeypatch.setattr(os, "scandir", failing_scandir)
+
+    entries, _ = scan(Path(tmpdir))
+
+    assert [path for path, _ in entries] == [str(tmpdir.join("world", "level.dat"))]
+
+
 def test_get_last_backup_timestamp(tmpdir):
     tmpdir.mkdir("20240101_012345")
     tmpdir.mkdir("20240101_012346")
@@ -27,6 +98,187 @@ def test_get_last_backup_timestamp(tmpdir):
     assert get_last_backup_datetime(Path(tmpdir)) == datetime(2024, 1, 1, 1, 23, 46)
 
 
+@pytest.mark.parametrize("reflink", [False, True])
+def test_copy_file(tmpdir, reflink):
+    src = tmpdir.join("src")
+    src.write_binary(bytes(range(256)) * 10000)
+    d = datetime(2024, 1, 1, 1, 23, 45)
+    os.utime(src, (d.timestamp(), d.timestamp()))
+    dest = tmpdir.join("dest")
+
+    copy_file(Path(src), Path(dest), os.stat(src), reflink)
+
+    assert dest.read_binary() == src.read_binary()
+    assert os.stat(dest).st_mtime == d.timestamp()
+    assert not os.stat(dest).st_mode & 0o111
+
+
+def test_copy_file_without_sendfile(tmpdir, monkeypatch):
+    def unsupported(*args):
+        raise OSError(errno.EINVAL, "sendfile not supported")
+    monkeypatch.setattr(os, "sendfile", unsupported, raising=False)
+    src = tmpdir.join("src")
+    src.write_binary(bytes(range(256)) * 10000)
+    dest = tmpdir.join("dest")
+
+    copy_file(Path(src), Path(dest), os.stat(src))
+
+    assert dest.read_binary() == src.read_binary()
+
+
+def test_backup_worlds(tmpdir):
+    minecraft = tmpdir.mkdir("minecraft")
+    minecraft.mkdir("world").mkdir("region").join("r.0.0.mca").write("region")
+    minecraft.join("world", "level.dat").write("level")
+    backup = tmpdir.mkdir("backup")
+
+    backup_worlds(Path(minecraft), Path(backup), copy_workers=2)
+
+    [backup_dir] = backup.listdir()
+    assert backup_dir.join("world", "region", "r.0.0.mca").read() == "region"
+    assert backup_dir.join("world", "level.dat").read() == "level"
+
+
+def test_backup_worlds_links_unchanged_files(tmpdir):
+    minecraft = tmpdir.mkdir("minecraft")
+    unchanged = minecraft.join("unchanged.dat")
+    unchanged.write("same")
+    changed = minecraft.join("changed.dat")
+    changed.write("new")
+    previous = tmpdir.mkdir("backup").mkdir("20240101_012345")
+    previous.join("unchanged.dat").write("same")
+    os.utime(previous.join("unchanged.dat"), ns=(0, os.stat(unchanged).st_mtime_ns))
+    previous.join("changed.dat").write("old")
+
+    backup_worlds(Path(minecraft), Path(tmpdir.join("backup")))
+
+    [backup_dir] = [d for d in tmpdir.join("backup").listdir() if d != previous]
+    assert os.path.samefile(backup_dir.join("unchanged.dat"), previous.join("unchanged.dat"))
+    assert backup_dir.join("changed.dat").read() == "new"
+
+
+def test_state_round_trip(tmpdir):
+    saved = BackupScheduler()
+    saved.last_modification_time = datetime(2024, 1, 1, 1, 23, 46)
+    saved.last_backup_time = datetime(2024, 1, 1, 1, 23, 45)
+    write_state(Path(tmpdir), saved)
+
+    loaded = BackupScheduler()
+    assert read_state(Path(tmpdir), loaded)
+    assert loaded.last_modification_time == saved.last_modification_time
+    assert loaded.last_backup_time == saved.last_backup_time
+
+
+def test_read_state_without_state_file(tmpdir):
+    assert not read_state(Path(tmpdir), BackupScheduler())
+
+
+@pytest.mark.parametrize("content", ['{"last_backup_time": "garbage"}', '{"last_backup_time": 5}', '[]', '{'])
+def test_read_state_with_malformed_state_file(tmpdir, content):
+    tmpdir.join("_state.json").write(content)
+    scheduler = BackupScheduler()
+
+    assert not read_state(Path(tmpdir), scheduler)
+    assert scheduler.last_backup_time is None
+    assert scheduler.last_modification_time is None
+
+
+@pytest.mark.skipif(not sys.platform.startswith('linux'), reason="inotify is only available on Linux")
+def test_inotify_watcher(tmpdir):
+    logs = tmpdir.mkdir("logs")
+    changed = threading.Event()
+    sut = InotifyWatcher(Path(tmpdir), changed.set, changed.set)
+    sut.start()
+    try:
+        logs.join("latest.log").write("ignored")
+        assert not changed.wait(0.3)
+        tmpdir.join("level.dat").write("")
+        assert changed.wait(5)
+    finally:
+        sut.stop()
+        sut.join(5)
+    assert not sut.is_alive()
+
+
+@pytest.mark.skipif(not sys.platform.startswith('linux'), reason="inotify is only available on Linux")
+def test_inotify_watcher_survives_callback_errors(tmpdir):
+    calls = [threading.Event(), threading.Event()]
+
+    def fail():
+        next(call for call in calls if not call.is_set()).set()
+        raise FileNotFoundError("vanished")
+
+    sut = InotifyWatcher(Path(tmpdir), fail, fail)
+    sut.start()
+    try:
+        tmpdir.join("level.dat").write("")
+        assert calls[0].wait(5)
+        tmpdir.join("level.dat").write("again")
+        assert calls[1].wait(5)
+    finally:
+        sut.stop()
+        sut.join(5)
+    assert not sut.is_alive()
+    sut.stop()
+
+
+@pytest.mark.parametrize("event, recorded", [
+    (FileCreatedEvent("/mc/world/region/r.0.0.mca"), True),
+    (FileDeletedEvent("/mc/world/region/r.0.0.mca"), True),
+    (FileModifiedEvent("/mc/world/level.dat"), True),
+    (FileMovedEvent("/mc/world/level.dat_new", "/mc/world/level.dat"), True),
+    (FileOpenedEvent("/mc/world/level.dat"), False),
+    (DirModifiedEvent("/mc/world/region"), False),
+    (FileModifiedEvent("/mc/logs/latest.log"), False),
+    (FileCreatedEvent("/mc/logs/2024-01-01-1.log.gz"), False),
+    (FileCreatedEvent("/mc/crash-reports/crash-2024-01-01.txt"), False),
+    (FileModifiedEvent("/mc/libraries/library.jar"), False),
+])
+def test_modification_watcher(event, recorded):
+    scheduler = BackupScheduler()
+    sut = ModificationWatcher(Path("/mc"), lambda: setattr(scheduler, "last_modification_time", datetime.now()),
+                              PathFilter.from_patterns(exclude_patterns=["libraries/**"]))
+
+    sut.dispatch(event)
+
+    assert (scheduler.last_modification_time is not None) == recorded
+
+
+@pytest.mark.skipif(not sys.platform.startswith('linux'), reason="inotify is only available on Linux")
+def test_inotify_watcher_fails_when_tree_cannot_be_watched(tmpdir, monkeypatch):
+    libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+
+    class NoWatchesLibc:
+        inotify_init1 = libc.inotify_init1
+
+        @staticmethod
+        def inotify_add_watch(*args):
+            ctypes.set_errno(errno.ENOSPC)
+            return -1
+
+    monkeypatch.setattr(ctypes, "CDLL", lambda *args, **kwargs: NoWatchesLibc)
+
+    with pytest.raises(OSError) as e:
+        InotifyWatcher(Path(tmpdir), lambda: None, lambda: None)
+    assert e.value.errno == errno.ENOSPC
+
+
+def test_start_auto_backup_returns_when_stopped(tmpdir):
+    minecraft = tmpdir.mkdir("minecraft")
+    level = minecraft.join("level.dat")
+    level.write("")
+    d1 = datetime(2024, 1, 1, 1, 23, 45)
+    os.utime(level, (d1.timestamp(), d1.timestamp()))
+    config = Config(Path(minecraft), Path(tmpdir.mkdir("backup")), timedelta(minutes=5))
+    backups = []
+    stop = threading.Event()
+    stop.set()
+
+    start_auto_backup(config, backups.append, stop)
+
+    assert [[path for path, _ in entries] for entries in backups] == [[str(level)]]
+
+
 @pytest.fixture
 def t0():
     return datetime.now()